@@ -1,17 +1,44 @@
 # Import necessary modules from Flask for creating the web application and handling requests.
-from flask import Flask, request, jsonify, render_template, send_file, redirect, url_for, flash, abort, make_response
+from flask import Flask, Response, request, jsonify, render_template, send_file, send_from_directory, redirect, url_for, flash, make_response
 # Import YouTubeTranscriptApi for fetching subtitles.
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
+from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound, RequestBlocked
+from youtube_transcript_api.proxies import GenericProxyConfig
 # Import os for reading environment variables.
 import os
+# Import click for the init-db CLI command's output.
+import click
 # Import io for handling in-memory files (important for sending text files without saving to disk).
 import io
+# Import zipfile for bundling several subtitle files into one download.
+import zipfile
+# Import ThreadPoolExecutor for fetching several videos' subtitles concurrently.
+from concurrent.futures import ThreadPoolExecutor
+# Import itertools for proxy rotation and functools for memoizing per-proxy sessions.
+import itertools
+import functools
+# Import threading for guarding the shared Markdown converter.
+import threading
+# Import time for expiring benched proxies.
+import time
+# Import hashlib for the homepage ETag.
+import hashlib
+# Import logging for lazily formatted, level-filtered diagnostics.
+import logging
+# Import re for validating video IDs and language codes before any network I/O.
+import re
 # Import requests for general HTTP handling, crucial for downloading thumbnails.
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# --- orjson import for fast JSON responses ---
+import orjson
+from flask.json.provider import DefaultJSONProvider
 
 # --- Database imports ---
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy.orm import load_only, with_expression
 from datetime import datetime # For timestamps in blog posts
 
 # --- Flask-Admin imports ---
@@ -25,21 +52,51 @@ from wtforms.validators import DataRequired, Length, EqualTo, ValidationError
 
 # --- Flask-Login imports ---
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash # Only for verifying hashes made before the switch to argon2
 from flask_wtf import FlaskForm # For creating web forms
 
+# --- argon2 import for password hashing ---
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
+
 # --- Flask-Mail imports for password reset ---
 from flask_mail import Mail, Message
-from itsdangerous import URLSafeTimedSerializer as Serializer # For generating secure secure tokens
+from itsdangerous import URLSafeTimedSerializer as Serializer, BadSignature # For generating secure secure tokens
+
+# --- Flask-Caching import for caching YouTube lookups ---
+from flask_caching import Cache
+
+# --- Flask-Compress import for compressing JSON and subtitle responses ---
+from flask_compress import Compress
 
 # --- Markdown import for rendering blog content ---
 import markdown
 
-print("DEBUG_CHECK: This app.py version is active! (All Routes Included - Final Check)") # <-- Контрольная строка
+# --- Logging Configuration ---
+# LOG_LEVEL=DEBUG turns on per-request diagnostics; at the default INFO they are skipped before formatting.
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
 
 # Initialize the Flask application.
 app = Flask(__name__, static_folder='.', template_folder='.')
 
+# --- JSON Provider ---
+# jsonify() and request.get_json() go through orjson, a C extension that is several times
+# faster than the stdlib json module.
+class ORJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response instead of round-tripping through str.
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default), mimetype=self.mimetype)
+
+app.json = ORJSONProvider(app)
+
 # --- Secret Key Configuration ---
 # Flask requires a secret key for session management, used by Flask-Admin and Flask-Login.
 # In production, this should be a strong, randomly generated key stored as an environment variable.
@@ -48,6 +105,9 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'a_very_secret_and_unique_key
 # --- Database Configuration ---
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///site.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Room for every compiled statement the app and Flask-Admin issue, so hot lookups (load_user, login,
+# the admin form validators) never fall out of SQLAlchemy's compiled-SQL cache. 2.x already implies future=True.
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'query_cache_size': 1200}
 
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
@@ -68,8 +128,86 @@ app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', 'noreply@yt
 
 mail = Mail(app)
 
+# SMTP handshakes take hundreds of milliseconds or more, so mail is sent off the request thread.
+mail_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='mail')
+
+# --- Cache Configuration ---
+# Transcripts are effectively immutable for a given video/language, so YouTube lookups are cached.
+# SimpleCache is per-process, so every gunicorn worker would hit YouTube for the same hot video.
+# When a Redis URL is configured (REDIS_URL is what Heroku's add-on sets) the cache is shared by all workers.
+app.config['CACHE_REDIS_URL'] = os.getenv('CACHE_REDIS_URL', os.getenv('REDIS_URL'))
+app.config['CACHE_TYPE'] = os.getenv('CACHE_TYPE', 'RedisCache' if app.config['CACHE_REDIS_URL'] else 'SimpleCache')
+# A SimpleCache lives inside one worker, so deleting an entry there leaves every other worker's copy in place.
+CACHE_IS_SHARED = app.config['CACHE_TYPE'].rsplit('.', 1)[-1] not in ('SimpleCache', 'simple')
+app.config['CACHE_DEFAULT_TIMEOUT'] = 86400
+# SimpleCache caps the number of entries, not bytes. Raw transcripts and formatted files are often 100 KB or
+# more, and every worker keeps its own copy, so the in-process default stays small: roughly 256 x 100 KB per
+# worker at worst. A real memory bound needs Redis (with a maxmemory policy); RedisCache ignores this setting.
+app.config['CACHE_THRESHOLD'] = int(os.getenv('CACHE_THRESHOLD', 256)) # Max entries an in-process cache holds before pruning
+
+cache = Cache(app)
+
+LIST_CACHE_TIMEOUT = int(os.getenv('CACHE_TTL', 86400)) # Available subtitle tracks, 1 day by default
+LIST_STALE_TIMEOUT = int(os.getenv('CACHE_STALE_TTL', 86400)) # How long past CACHE_TTL a listing may still be served while it refreshes
+TRANSCRIPT_CACHE_TIMEOUT = int(os.getenv('TRANSCRIPT_CACHE_TTL', 7 * 86400)) # Transcripts and formatted files, 7 days by default
+MISSING_CACHE_TIMEOUT = int(os.getenv('MISSING_CACHE_TTL', 600)) # How long "subtitles disabled / not found" answers are remembered
+INFLIGHT_LOCK_TIMEOUT = 15 # Seconds a worker may hold the fetch lock for one cache key
+INFLIGHT_POLL_INTERVAL = 0.1 # Seconds between cache checks while another worker fetches the same key
+SUBTITLE_MAX_AGE = 86400 # Seconds browsers and CDNs may reuse a downloaded subtitle file
+
+# --- Response Compression ---
+# JSON listings and SRT/TXT files compress roughly 5-10x. Brotli is preferred when the client accepts it,
+# gzip otherwise; streamed downloads are compressed chunk by chunk (COMPRESS_STREAMS defaults to True).
+# Streams have their own algorithm list, whose default (zstd, br, deflate) would send them to gzip-only
+# clients uncompressed, so it is set to match.
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_ALGORITHM_STREAMING'] = ['br', 'gzip']
+app.config['COMPRESS_MIMETYPES'] = ['text/html', 'text/plain', 'application/x-subrip', 'application/json', 'application/xml']
+app.config['COMPRESS_MIN_SIZE'] = 500 # Bytes; smaller bodies are not worth the CPU or the extra header
+
+compress = Compress(app)
+
+# --- Batch Endpoint Limits ---
+BATCH_MAX_VIDEOS = 50 # Maximum number of video IDs accepted by /api/fetch_subtitles_batch
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 8)) # Concurrent YouTube lookups across all batch requests
+
+# One long-lived pool shared by every batch request: no per-request thread start-up, and the cap
+# on in-flight YouTube lookups holds for the whole worker rather than per request.
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix='subtitles-batch')
+
+# Background re-fetches of stale subtitle listings; kept separate so they never queue behind batch lookups.
+refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='subtitles-refresh')
+
 # --- Register Markdown filter for Jinja2 ---
-app.jinja_env.filters['markdown'] = markdown.markdown
+# markdown.markdown() builds a new Markdown instance (and all its processors) on every call; one shared
+# instance is reset between conversions instead. Markdown objects are not thread-safe, hence the lock.
+_markdown = markdown.Markdown()
+_markdown_lock = threading.Lock()
+
+def render_markdown(text):
+    """Converts Markdown source to HTML with the shared converter."""
+    with _markdown_lock:
+        return _markdown.reset().convert(text)
+
+app.jinja_env.filters['markdown'] = render_markdown
+
+# --- Password Hashing ---
+# argon2id with OWASP's minimum profile (19 MiB, 2 passes, 1 lane) verifies in ~35 ms, against ~150 ms for
+# werkzeug's default scrypt, and its 97-character hashes fit User.password_hash (scrypt's 162 do not).
+# The cost can be raised per deployment; existing hashes are upgraded by check_password on the next login.
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', 2)) # Passes over memory
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', 19 * 1024)) # KiB of memory per hash
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', 1)) # Lanes
+password_hasher = PasswordHasher(time_cost=ARGON2_TIME_COST, memory_cost=ARGON2_MEMORY_COST, parallelism=ARGON2_PARALLELISM)
+# Hash of a random throwaway password. Logins for unknown usernames are checked against it, so they take
+# as long as a wrong password and response times don't reveal which usernames exist.
+_DUMMY_PASSWORD_HASH = password_hasher.hash(os.urandom(16).hex())
+
+# --- Password Reset Tokens ---
+# Built once; the salt keeps these tokens from being accepted anywhere else SECRET_KEY signs data.
+# The timed serializer records when a token was issued, and loads(max_age=...) is what enforces expiry.
+reset_serializer = Serializer(app.config['SECRET_KEY'], salt='password-reset')
+RESET_TOKEN_MAX_AGE = 1800 # Seconds a password reset link stays valid
 
 # --- User Model Definition ---
 class User(db.Model, UserMixin):
@@ -82,24 +220,60 @@ class User(db.Model, UserMixin):
         return f"User('{self.username}', '{self.email}')"
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
-
-    def get_reset_token(self, expires_sec=1800):
-        s = Serializer(app.config['SECRET_KEY'])
-        return s.dumps({'user_id': self.id})
+        """Verifies password; on success, hashes from older schemes or parameters are upgraded in place."""
+        if not self.password_hash:
+            return False
+        if self.password_hash.startswith('$argon2'):
+            try:
+                password_hasher.verify(self.password_hash, password)
+            except (VerificationError, InvalidHashError):
+                return False
+            if password_hasher.check_needs_rehash(self.password_hash):
+                self.set_password(password)
+            return True
+        # Legacy werkzeug pbkdf2/scrypt hash.
+        if not check_password_hash(self.password_hash, password):
+            return False
+        self.set_password(password)
+        return True
+
+    def get_reset_token(self):
+        return reset_serializer.dumps({'user_id': self.id})
 
     @staticmethod
-    def verify_reset_token(token):
-        s = Serializer(app.config['SECRET_KEY'])
+    def verify_reset_token(token, expires_sec=RESET_TOKEN_MAX_AGE):
         try:
-            user_id = s.loads(token)['user_id']
-        except:
+            user_id = reset_serializer.loads(token, max_age=expires_sec)['user_id']
+        except BadSignature: # Also covers SignatureExpired
             return None
         return db.session.get(User, user_id)
 
+def taken_user_fields(username=None, email=None):
+    """Returns which of 'username' and 'email' already belong to a user, checking both in one query."""
+    conditions = []
+    if username:
+        conditions.append(User.username == username)
+    if email:
+        conditions.append(User.email == email)
+    if not conditions:
+        return set()
+
+    taken = set()
+    # Both columns are unique, so at most two rows can match.
+    for row_username, row_email in db.session.query(User.username, User.email).filter(db.or_(*conditions)).limit(2):
+        if username and row_username == username:
+            taken.add('username')
+        if email and row_email == email:
+            taken.add('email')
+    return taken
+
+def users_exist():
+    """True if at least one user is registered; EXISTS stops at the first row instead of counting them all."""
+    return db.session.query(User.query.exists()).scalar()
+
 @login_manager.user_loader
 def load_user(user_id):
     return db.session.get(User, int(user_id))
@@ -110,8 +284,15 @@ class Post(db.Model):
     title = db.Column(db.String(120), nullable=False)
     slug = db.Column(db.String(120), unique=True, nullable=False)
     content = db.Column(db.Text, nullable=False)
-    date_posted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    content_html = db.Column(db.Text, nullable=False, default='') # content rendered from Markdown when the post is saved
+    # Stamped by the database on INSERT; it is already the second key of the composite index below.
+    date_posted = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
     is_published = db.Column(db.Boolean, default=False)
+    # Only populated by queries that ask for it (see blog_list), so listings need not load the full content.
+    excerpt = db.query_expression()
+
+    # /blog and the sitemap filter on is_published and order by date_posted, which this index serves as one range scan.
+    __table_args__ = (db.Index('ix_post_is_published_date_posted', is_published, date_posted.desc()),)
 
     def __repr__(self):
         return f"Post('{self.title}', '{self.date_posted}')"
@@ -125,13 +306,11 @@ class PostAdminForm(BaseForm):
 
 class ProtectedModelView(ModelView):
     def is_accessible(self):
-        # Добавляем отладочный вывод
-        print(f"DEBUG: ProtectedModelView.is_accessible called. current_user.is_authenticated: {current_user.is_authenticated}")
+        app.logger.debug("ProtectedModelView.is_accessible: authenticated=%s", current_user.is_authenticated)
         return current_user.is_authenticated
 
     def inaccessible_callback(self, name, **kwargs):
-        # Добавляем отладочный вывод
-        print(f"DEBUG: ProtectedModelView.inaccessible_callback called. Redirecting to login.")
+        app.logger.debug("ProtectedModelView.inaccessible_callback: redirecting to login")
         flash('You must be logged in to access this page.', 'danger')
         return redirect(url_for('login', next=request.url))
 
@@ -140,21 +319,36 @@ class PostAdminView(ProtectedModelView):
     column_list = ('title', 'slug', 'date_posted', 'is_published')
     form_columns = ('title', 'slug', 'content', 'is_published')
 
+    def on_model_change(self, form, model, is_created):
+        # Posts are read far more often than written, so Markdown is rendered once here rather than on every view.
+        model.content_html = render_markdown(model.content)
+        return super().on_model_change(form, model, is_created)
+
+    def after_model_change(self, form, model, is_created):
+        # Runs after the commit; the old slug's page goes too in case the post was renamed.
+        invalidate_blog_cache(model.slug, form.slug.object_data)
+
+    def after_model_delete(self, model):
+        invalidate_blog_cache(model.slug)
+
 # --- Flask-Admin Custom ModelView for User (Protected and Custom Form) ---
 class UserAdminForm(BaseForm):
     username = StringField('Username', validators=[DataRequired(), Length(min=4, max=64)])
     email = StringField('Email', validators=[DataRequired(), Length(min=6, max=120)])
     password = PasswordField('New Password (leave blank to keep current)', validators=[Length(min=6, max=128)])
 
-    def validate_username(self, field):
-        if field.data and User.query.filter_by(username=field.data).first() and \
-           (self._obj is None or self._obj.username != field.data):
-            raise ValidationError('This username is already taken.')
-
-    def validate_email(self, field):
-        if field.data and User.query.filter_by(email=field.data).first() and \
-           (self._obj is None or self._obj.email != field.data):
-            raise ValidationError('This email is already taken.')
+    def validate(self, extra_validators=None):
+        valid = super().validate(extra_validators)
+        # Only values that differ from the user being edited are checked, so a save without a rename runs no query.
+        obj = self._obj
+        username = self.username.data if obj is None or obj.username != self.username.data else None
+        email = self.email.data if obj is None or obj.email != self.email.data else None
+        taken = taken_user_fields(username, email)
+        if 'username' in taken:
+            self.username.errors.append('This username is already taken.')
+        if 'email' in taken:
+            self.email.errors.append('This email is already taken.')
+        return valid and not taken
 
 class UserAdminView(ProtectedModelView):
     form = UserAdminForm
@@ -170,13 +364,11 @@ class UserAdminView(ProtectedModelView):
 # --- Custom Admin Index View to protect the main admin page ---
 class MyAdminIndexView(AdminIndexView):
     def is_accessible(self):
-        # Добавляем отладочный вывод
-        print(f"DEBUG: MyAdminIndexView.is_accessible called. current_user.is_authenticated: {current_user.is_authenticated}")
+        app.logger.debug("MyAdminIndexView.is_accessible: authenticated=%s", current_user.is_authenticated)
         return current_user.is_authenticated
 
     def inaccessible_callback(self, name, **kwargs):
-        # Добавляем отладочный вывод
-        print(f"DEBUG: MyAdminIndexView.inaccessible_callback called. Redirecting to login.")
+        app.logger.debug("MyAdminIndexView.inaccessible_callback: redirecting to login")
         flash('You must be logged in to access the admin dashboard.', 'danger')
         return redirect(url_for('login', next=request.url))
 
@@ -199,15 +391,14 @@ class RegistrationForm(FlaskForm):
     password2 = PasswordField('Repeat Password', validators=[DataRequired(), EqualTo('password')])
     submit = SubmitField('Register')
 
-    def validate_username(self, username):
-        user = User.query.filter_by(username=username.data).first()
-        if user is not None:
-            raise ValidationError('Please use a different username.')
-
-    def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user is not None:
-            raise ValidationError('Please use a different email address.')
+    def validate(self, extra_validators=None):
+        valid = super().validate(extra_validators)
+        taken = taken_user_fields(self.username.data, self.email.data)
+        if 'username' in taken:
+            self.username.errors.append('Please use a different username.')
+        if 'email' in taken:
+            self.email.errors.append('Please use a different email address.')
+        return valid and not taken
 
 # --- Password Reset Forms ---
 class RequestResetForm(FlaskForm):
@@ -215,8 +406,7 @@ class RequestResetForm(FlaskForm):
     submit = SubmitField('Request Password Reset')
 
     def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user is None:
+        if db.session.query(User.id).filter_by(email=email.data).first() is None:
             raise ValidationError('There is no account with that email. You must register first.')
 
 class ResetPasswordForm(FlaskForm):
@@ -226,104 +416,457 @@ class ResetPasswordForm(FlaskForm):
 
 # --- Proxy Configuration ---
 PROXIES_LIST_RAW = os.getenv('PROXIES_LIST', '').split(',')
-PROXIES_URLS_CLEANED = [p.strip() for p in PROXIES_LIST_RAW if p.strip()]
-current_proxy_index = 0
-
-def set_global_proxy_env(proxy_url):
-    """Sets HTTP_PROXY and HTTPS_PROXY environment variables."""
-    os.environ['HTTP_PROXY'] = proxy_url
-    os.environ['HTTPS_PROXY'] = proxy_url
-    print(f"Set environment proxies to: {proxy_url}")
-
-def clear_global_proxy_env():
-    """Clears HTTP_PROXY and HTTPS_PROXY environment variables."""
-    if 'HTTP_PROXY' in os.environ:
-        del os.environ['HTTP_PROXY']
-    if 'HTTPS_PROXY' in os.environ:
-        del os.environ['HTTPS_PROXY']
-    print("Cleared environment proxies.")
+# Duplicates are dropped (keeping first-seen order) so a proxy listed twice doesn't get twice the traffic.
+PROXIES_URLS_CLEANED = list(dict.fromkeys(p.strip() for p in PROXIES_LIST_RAW if p.strip()))
+# requests-style proxies dicts for each proxy's session, built once.
+PROXY_DICTS = {p: {'http': p, 'https': p} for p in PROXIES_URLS_CLEANED}
+
+# Round-robin over the proxies. next() on an itertools.cycle is a single C call, so it is atomic
+# under the GIL and never yields to another greenlet; no lock is needed.
+_proxy_cycle = itertools.cycle(PROXIES_URLS_CLEANED) if PROXIES_URLS_CLEANED else None
+
+# Proxies that fail or get blocked by YouTube are benched for PROXY_BAN_TTL seconds so a single
+# bad proxy doesn't keep failing every Nth request.
+PROXY_BAN_TTL = int(os.getenv('PROXY_BAN_TTL', 4 * 3600))
+_benched_proxies = {} # proxy URL -> time.monotonic() at which it may be used again
+
+def pick_proxy():
+    """Returns the next non-benched proxy URL in the rotation, or None when no proxies are configured."""
+    if not _proxy_cycle:
+        return None
+    now = time.monotonic()
+    for _ in range(len(PROXIES_URLS_CLEANED)):
+        proxy_url = next(_proxy_cycle)
+        if _benched_proxies.get(proxy_url, 0) <= now:
+            return proxy_url
+    # Every proxy is benched; keep rotating rather than refusing to serve.
+    return next(_proxy_cycle)
+
+def bench_proxy(proxy_url):
+    """Takes proxy_url out of the rotation for PROXY_BAN_TTL seconds."""
+    if proxy_url:
+        _benched_proxies[proxy_url] = time.monotonic() + PROXY_BAN_TTL
+        app.logger.warning("Benching proxy #%d for %ds after a proxy error or YouTube block",
+                           PROXIES_URLS_CLEANED.index(proxy_url), PROXY_BAN_TTL)
+
+# One pooled session per proxy (plus a direct one for None), created lazily on first use and then
+# memoized. Reusing them keeps TLS connections to YouTube alive across requests instead of
+# mutating os.environ and paying a fresh handshake on every call; proxies that are never picked
+# never allocate a pool, and a debug-mode reload can't end up with duplicate pools per proxy.
+@functools.lru_cache(maxsize=None)
+def make_session(proxy_url=None):
+    """Builds a requests.Session with a keep-alive connection pool, optionally routed through proxy_url."""
+    session = requests.Session()
+    # pool_maxsize is sized for many concurrent greenlets per worker; surplus connections would otherwise
+    # be opened and thrown away. 429 is deliberately not retried, as hammering YouTube makes bans worse.
+    # raise_on_status=False hands back the last 5xx once retries run out, so callers' raise_for_status() sees an
+    # ordinary HTTPError with the real status instead of a RetryError.
+    retries = Retry(total=2, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=64, max_retries=retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if proxy_url:
+        session.proxies = PROXY_DICTS[proxy_url]
+    return session
+
+@functools.lru_cache(maxsize=None)
+def transcript_api(proxy_url=None):
+    """Returns the shared YouTubeTranscriptApi client bound to proxy_url's pooled session."""
+    # Passing the proxy as a ProxyConfig (rather than only via session.proxies) lets the library
+    # report blocked requests as proxy problems instead of as the server's own IP being banned.
+    proxy_config = GenericProxyConfig(http_url=proxy_url, https_url=proxy_url) if proxy_url else None
+    return YouTubeTranscriptApi(proxy_config=proxy_config, http_client=make_session(proxy_url))
+
+# --- Subtitle Formatting Helpers ---
+_TS_FMT = "%02d:%02d:%02d,%03d"
+
+def _fmt_ts(ms):
+    """Formats a millisecond offset as an SRT timestamp (HH:MM:SS,mmm)."""
+    h, ms = divmod(ms, 3_600_000)
+    m, ms = divmod(ms, 60_000)
+    s, ms = divmod(ms, 1_000)
+    return _TS_FMT % (h, m, s, ms)
+
+# A whole SRT cue (index, timing line, text, blank separator) rendered by a single % operation.
+_SRT_CUE = "%d\n%s --> %s\n%s\n\n"
+
+def _iter_srt(transcript):
+    """Yields the transcript as UTF-8 encoded SRT cues, one chunk per cue."""
+    for i, entry in enumerate(transcript, 1):
+        start_ms = int(entry['start'] * 1000)
+        end_ms = int((entry['start'] + entry['duration']) * 1000)
+        yield (_SRT_CUE % (i, _fmt_ts(start_ms), _fmt_ts(end_ms), entry['text'])).encode('utf-8')
+
+TXT_LINES_PER_CHUNK = 512 # Lines joined and encoded per chunk; one str.join beats encoding every line on its own
+
+def _iter_txt(transcript):
+    """Yields the transcript as UTF-8 encoded plain-text lines, TXT_LINES_PER_CHUNK at a time."""
+    for i in range(0, len(transcript), TXT_LINES_PER_CHUNK):
+        yield ("\n".join([entry['text'] for entry in transcript[i:i + TXT_LINES_PER_CHUNK]]) + "\n").encode('utf-8')
+
+# Cues are tiny, so they are coalesced into blocks of roughly this size before being written out;
+# otherwise every cue would cost its own socket write and chunked-encoding frame.
+STREAM_BLOCK_SIZE = 16 * 1024
+
+def _stream_and_cache(chunks, cache_key):
+    """Passes chunks through to the client in ~16 KiB blocks as they are produced, then caches the assembled body."""
+    blocks = []
+    pending = []
+    pending_size = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size >= STREAM_BLOCK_SIZE:
+            block = b"".join(pending)
+            blocks.append(block)
+            yield block
+            pending = []
+            pending_size = 0
+    if pending:
+        block = b"".join(pending)
+        blocks.append(block)
+        yield block
+    cache.set(cache_key, b"".join(blocks), timeout=TRANSCRIPT_CACHE_TIMEOUT)
+
+# --- YouTube Transcript Helpers ---
+# YouTube video IDs are always 11 URL-safe base64 characters; language codes look like
+# 'en', 'pt-BR', 'zh-Hans' or 'es-419'. Rejecting anything else saves a wasted YouTube round trip.
+# fullmatch, unlike match with '$', also rejects a trailing newline.
+_VIDEO_ID_RE = re.compile(r'[A-Za-z0-9_-]{11}').fullmatch
+_LANG_RE = re.compile(r'[A-Za-z0-9-]{2,16}').fullmatch
+
+# Thumbnail sizes YouTube serves under img.youtube.com/vi/<id>/, largest first.
+THUMBNAIL_SIZES = ('maxresdefault', 'sddefault', 'hqdefault', 'mqdefault', 'default')
+THUMBNAIL_RESOLUTIONS = frozenset(THUMBNAIL_SIZES)
+THUMBNAIL_URL = "https://img.youtube.com/vi/{video_id}/{resolution}.jpg"
+THUMBNAIL_TIMEOUT = (3, 10) # (connect, read) seconds for img.youtube.com
+
+# resolution=best probes every size at once. They get their own pool so they never wait behind batch
+# transcript lookups in batch_executor, and so they don't count against that pool's cap on YouTube lookups.
+thumbnail_executor = ThreadPoolExecutor(max_workers=len(THUMBNAIL_SIZES) * 4, thread_name_prefix='thumbnail-probe')
+THUMBNAIL_CHUNK_SIZE = 64 * 1024 # Bytes relayed to the client per read from img.youtube.com
+
+def _is_valid_video_id(video_id):
+    return isinstance(video_id, str) and _VIDEO_ID_RE(video_id) is not None
+
+def _cached_fetch(cache_key, fetch, timeout):
+    """Returns the cached value for cache_key, calling fetch() on a miss. Concurrent misses share one fetch."""
+    value = cache.get(cache_key)
+    if value is not None:
+        return value
+    _raise_if_missing(cache_key)
+
+    # cache.add() only succeeds for the first caller, so it doubles as a lock that spans workers
+    # when the cache is Redis. Everyone else waits for that caller's result instead of hitting YouTube.
+    lock_key = f"{cache_key}:lock"
+    while not cache.add(lock_key, 1, timeout=INFLIGHT_LOCK_TIMEOUT):
+        deadline = time.monotonic() + INFLIGHT_LOCK_TIMEOUT
+        while time.monotonic() < deadline and cache.has(lock_key):
+            time.sleep(INFLIGHT_POLL_INTERVAL)
+            value = cache.get(cache_key)
+            if value is not None:
+                return value
+        # The owner may have stored its result and released the lock between our last two checks.
+        value = cache.get(cache_key)
+        if value is not None:
+            return value
+        _raise_if_missing(cache_key)
+        # The owner failed or its lock expired. Go round again so that only one waiter takes the lock
+        # and refetches while the rest keep waiting for it.
+
+    try:
+        return _fetch_and_cache(cache_key, fetch, timeout)
+    finally:
+        cache.delete(lock_key)
+
+def _fetch_and_cache(cache_key, fetch, timeout):
+    try:
+        value = fetch()
+    except (TranscriptsDisabled, NoTranscriptFound) as e:
+        # These won't change from one request to the next, so remember them briefly instead of asking YouTube again.
+        cache.set(f"{cache_key}:missing", _known_youtube_error(e), timeout=MISSING_CACHE_TIMEOUT)
+        raise
+    cache.set(cache_key, value, timeout=timeout)
+    return value
+
+def _raise_if_missing(cache_key):
+    missing = cache.get(f"{cache_key}:missing")
+    if missing is not None:
+        raise RecentlyMissing(*missing)
+
+def _refresh_in_background(cache_key, fetch, timeout):
+    try:
+        _fetch_and_cache(cache_key, fetch, timeout)
+    except Exception as e:
+        # The stale entry stays in place; the next request after the refresh lock expires tries again.
+        app.logger.warning("Background refresh of %s failed: %s", cache_key, e)
+
+def _list_subtitles(video_id):
+    """Returns the subtitle tracks available for video_id, served from the cache when possible.
+
+    Listings older than LIST_CACHE_TIMEOUT are still returned immediately, and a single background
+    refresh replaces them, so no request waits on YouTube just because the cached copy aged out.
+    """
+    cache_key = f"subs:list:{video_id}"
+
+    def fetch():
+        proxy_url = pick_proxy()
+        try:
+            transcript_list = transcript_api(proxy_url).list(video_id)
+        except (requests.exceptions.ProxyError, RequestBlocked):
+            bench_proxy(proxy_url)
+            raise
+
+        # list() has already fetched everything, so iterating the TranscriptList directly is local work.
+        available_subtitles = [{
+            "lang": transcript.language_code,
+            "name": transcript.language,
+            "is_auto_generated": transcript.is_generated,
+            "is_translatable": transcript.is_translatable
+        } for transcript in transcript_list]
+        return time.time(), available_subtitles
+
+    fetched_at, available_subtitles = _cached_fetch(cache_key, fetch, LIST_CACHE_TIMEOUT + LIST_STALE_TIMEOUT)
+    if time.time() - fetched_at > LIST_CACHE_TIMEOUT and cache.add(f"{cache_key}:refresh", 1, timeout=INFLIGHT_LOCK_TIMEOUT):
+        refresh_executor.submit(_refresh_in_background, cache_key, fetch, LIST_CACHE_TIMEOUT + LIST_STALE_TIMEOUT)
+    return available_subtitles
+
+def _get_transcript(video_id, lang):
+    """Returns the raw transcript entries for video_id in lang, served from the cache when possible."""
+    def fetch():
+        proxy_url = pick_proxy()
+        try:
+            # preserve_formatting=False lets the parser strip all markup in one pass; our formatters want plain text.
+            return transcript_api(proxy_url).fetch(video_id, languages=[lang], preserve_formatting=False).to_raw_data()
+        except (requests.exceptions.ProxyError, RequestBlocked):
+            bench_proxy(proxy_url)
+            raise
+
+    return _cached_fetch(f"subs:tx:{video_id}:{lang}", fetch, TRANSCRIPT_CACHE_TIMEOUT)
+
+def _subtitle_file_key(video_id, lang, file_format):
+    """Cache key of a formatted subtitle file; single downloads and the batch ZIP share these entries."""
+    return f"subs:fmt:{video_id}:{lang}:{file_format}"
+
+def _get_subtitle_file(video_id, lang, file_format):
+    """Returns the whole formatted subtitle file as bytes, sharing download_subtitle's cache entry."""
+    body_key = _subtitle_file_key(video_id, lang, file_format)
+    body = cache.get(body_key)
+    if body is None:
+        transcript = _get_transcript(video_id, lang)
+        body = b"".join(_iter_txt(transcript) if file_format == 'txt' else _iter_srt(transcript))
+        cache.set(body_key, body, timeout=TRANSCRIPT_CACHE_TIMEOUT)
+    return body
+
+# --- YouTube Error Mapping ---
+# Every subtitle endpoint reports transcript library and network failures the same way.
+# Checked in order with isinstance, so subclasses (ProxyError, IpBlocked, ...) match their base entry.
+YOUTUBE_ERRORS = (
+    (TranscriptsDisabled, 404, "Subtitles are disabled for this video."),
+    (NoTranscriptFound, 404, "No subtitles found for this video (or they are not public/available)."),
+    (RequestBlocked, 503, "YouTube is temporarily refusing our requests. Please try again in a few minutes."),
+    (requests.exceptions.RequestException, 503, "A network or proxy error occurred. Please try again or check proxy settings."),
+)
+
+class RecentlyMissing(Exception):
+    """Replays a TranscriptsDisabled/NoTranscriptFound answer remembered in the cache."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def _known_youtube_error(e):
+    """Returns the (status, message) YOUTUBE_ERRORS assigns to e, or None if it isn't listed."""
+    if isinstance(e, RecentlyMissing):
+        return e.status, e.message
+    for exc_type, status, message in YOUTUBE_ERRORS:
+        if isinstance(e, exc_type):
+            return status, message
+    return None
+
+def _youtube_error(e, action, context):
+    """Maps an exception raised while talking to YouTube to (status, message), logging server-side failures."""
+    known = _known_youtube_error(e)
+    if known is None:
+        app.logger.error("Error %s (%s)", action, context, exc_info=e)
+        return 500, f"An unexpected error occurred while {action}."
+    if known[0] >= 500:
+        app.logger.warning("Network or proxy error %s (%s): %s", action, context, e)
+    return known
+
+def youtube_errors(action):
+    """Decorator turning YouTube lookup failures in a view into the standard JSON error response."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                return view(*args, **kwargs)
+            except Exception as e:
+                status, message = _youtube_error(e, action, request.path)
+                return jsonify({"success": False, "message": message}), status
+        return wrapper
+    return decorator
+
+# --- Page Caching ---
+# The marketing and tool pages have no per-request context, so each is rendered once per worker and the
+# bytes are reused. The blog pages and sitemap depend on the database and live in the cache instead, until
+# PostAdminView invalidates them. Every page carries an ETag so revalidating browsers get a bodiless 304.
+STATIC_PAGE_MAX_AGE = 300 # Seconds clients may reuse a page before revalidating
+ADS_TXT_MAX_AGE = 86400 # Seconds clients may reuse ads.txt before revalidating
+# Invalidation only reaches every worker through a shared cache. With a per-worker SimpleCache, the other
+# workers keep serving their copy of an edited, unpublished or deleted post until it expires, so keep that short.
+BLOG_CACHE_TIMEOUT = 3600 if CACHE_IS_SHARED else 30 # Seconds a rendered blog page stays cached if nothing invalidates it first
+_STATIC_PAGES = {}
+
+def _render_page(template_name, **context):
+    """Renders a template to (bytes, ETag), the form every cached page is stored in."""
+    body = render_template(template_name, **context).encode('utf-8')
+    return body, hashlib.md5(body).hexdigest()
+
+def _html_response(page, max_age):
+    """Wraps a rendered (bytes, ETag) page in a response that answers If-None-Match with 304."""
+    body, etag = page
+    response = Response(body, mimetype='text/html')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
+
+def render_static_page(template_name):
+    """Renders a template without per-request context once, then serves the stored bytes."""
+    page = _STATIC_PAGES.get(template_name)
+    if page is None:
+        page = _STATIC_PAGES[template_name] = _render_page(template_name)
+    return _html_response(page, STATIC_PAGE_MAX_AGE)
+
+def invalidate_blog_cache(*slugs):
+    """Drops the cached sitemap, blog listing pages and the given posts' pages after an admin edit."""
+    # One page past the current last one, in case the edit just unpublished the only post on it.
+    last_page = Post.query.filter_by(is_published=True).count() // BLOG_POSTS_PER_PAGE + 2
+    cache.delete_many('blog:sitemap',
+                      *(f"blog:list:{page}" for page in range(1, last_page + 1)),
+                      *(f"blog:post:{slug}" for slug in slugs if slug))
 
 # --- ROUTES ---
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_static_page('index.html')
 
 # NEW: Route to serve ads.txt directly from the root
 @app.route('/ads.txt')
 def serve_ads_txt():
-    # Construct the full path to the ads.txt file
-    # os.getcwd() gets the current working directory, which should be your project root
-    ads_txt_path = os.path.join(os.getcwd(), 'ads.txt')
-    
-    # Check if the file exists
-    if not os.path.exists(ads_txt_path):
-        # If the file doesn't exist, return a 404 error
-        print(f"ads.txt not found at: {ads_txt_path}")
-        abort(404) # Flask's way to return a 404 Not Found
-    
-    # Serve the file directly
-    return send_file(ads_txt_path, mimetype='text/plain')
+    # ads.txt sits next to app.py and only changes on deploy. send_from_directory answers 404 itself
+    # when it is missing and adds ETag/Last-Modified, so crawlers mostly get a bodiless 304.
+    return send_from_directory(app.root_path, 'ads.txt', mimetype='text/plain', max_age=ADS_TXT_MAX_AGE)
 
 
 # Route for the main tools page
 @app.route('/tools')
 def tools_list_page():
-    return render_template('tools.html')
+    return render_static_page('tools.html')
 
 # Routes for individual tool pages
 @app.route('/tools/video-idea-generator')
 def video_idea_generator_page():
-    return render_template('video_idea_generator.html')
+    return render_static_page('video_idea_generator.html')
 
 @app.route('/tools/seo-title-description-optimizer')
 def seo_title_description_optimizer_page():
-    return render_template('seo_title_description_optimizer.html')
+    return render_static_page('seo_title_description_optimizer.html')
 
 @app.route('/tools/youtube-keyword-research')
 def youtube_keyword_research_page():
-    return render_template('youtube_keyword_research.html')
+    return render_static_page('youtube_keyword_research.html')
 
 # NEW ROUTE: YouTube Subtitle Downloader page
 @app.route('/tools/youtube-subtitle-downloader')
 def youtube_subtitle_downloader_page():
-    return render_template('subtitle_downloader.html')
+    return render_static_page('subtitle_downloader.html')
 
 # NEW ROUTE: YouTube Thumbnail Downloader page
 @app.route('/tools/youtube-thumbnail-downloader')
 def youtube_thumbnail_downloader_page():
-    return render_template('youtube_thumbnail_downloader.html')
+    return render_static_page('youtube_thumbnail_downloader.html')
 
 # New routes for general pages
 @app.route('/pricing')
 def pricing_page():
-    return render_template('pricing.html')
+    return render_static_page('pricing.html')
 
 @app.route('/faq')
 def faq_page():
-    return render_template('faq.html')
+    return render_static_page('faq.html')
 
 @app.route('/contact')
 def contact_page():
-    return render_template('contact.html')
+    return render_static_page('contact.html')
 
 @app.route('/get-started')
 def get_started_page():
-    return render_template('get_started.html')
+    return render_static_page('get_started.html')
+
 
+BLOG_EXCERPT_LENGTH = 250 # Characters of each post shown on /blog
+BLOG_POSTS_PER_PAGE = 20 # Posts per /blog page
+BLOG_POST_MAX_AGE = 3600 # Seconds browsers and CDNs may reuse a blog post before revalidating
 
 @app.route('/blog')
 def blog_list():
-    posts = Post.query.filter_by(is_published=True).order_by(Post.date_posted.desc()).all()
-    return render_template('blog_list.html', posts=posts, title="Blog")
+    page_number = request.args.get('page', 1, type=int)
+    cache_key = f"blog:list:{page_number}"
+    page = cache.get(cache_key)
+    if page is None:
+        # Fetch only what the listing renders: one page of posts, with the excerpt cut in SQL
+        # instead of loading every post's full content. Out-of-range pages are a 404.
+        pagination = Post.query.options(
+            load_only(Post.title, Post.slug, Post.date_posted),
+            with_expression(Post.excerpt, db.func.substr(Post.content, 1, BLOG_EXCERPT_LENGTH)),
+        ).filter_by(is_published=True).order_by(Post.date_posted.desc()).paginate(
+            page=page_number, per_page=BLOG_POSTS_PER_PAGE)
+        page = _render_page('blog_list.html', posts=pagination.items, pagination=pagination, title="Blog")
+        cache.set(cache_key, page, timeout=BLOG_CACHE_TIMEOUT)
+    return _html_response(page, STATIC_PAGE_MAX_AGE)
 
 @app.route('/blog/<slug>')
 def blog_post(slug):
-    post = Post.query.filter_by(slug=slug, is_published=True).first_or_404()
-    return render_template('blog_post.html', post=post, title=post.title)
+    # Posts carry no last-modified time, so the ETag hashes the rendered page itself: edits and template
+    # changes produce a new tag, and readers revalidating an unchanged post get a bodiless 304.
+    cache_key = f"blog:post:{slug}"
+    page = cache.get(cache_key)
+    if page is None:
+        post = Post.query.filter_by(slug=slug, is_published=True).first_or_404()
+        page = _render_page('blog_post.html', post=post, title=post.title)
+        cache.set(cache_key, page, timeout=BLOG_CACHE_TIMEOUT)
+    return _html_response(page, BLOG_POST_MAX_AGE)
 
 @app.route('/sitemap.xml', methods=['GET'])
 def sitemap():
     """Generates the sitemap.xml file."""
+    root = request.url_root.rstrip("/")
+    xml_content = ''.join([
+        '<?xml version="1.0" encoding="UTF-8"?>\n',
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n',
+        *(f'  <url>\n'
+          f'    <loc>{root}{path}</loc>\n'
+          f'    <lastmod>{lastmod}</lastmod>\n'
+          f'    <priority>{priority}</priority>\n'
+          f'  </url>\n' for path, lastmod, priority in _sitemap_entries()),
+        '</urlset>\n',
+    ])
+
+    response = make_response(xml_content)
+    response.headers["Content-Type"] = "application/xml"
+    return response
+
+SITEMAP_BATCH_SIZE = 500 # Published posts fetched per round trip while building the sitemap
+
+def _sitemap_entries():
+    """Returns the sitemap's (path, lastmod, priority) rows, cached until invalidate_blog_cache() drops them."""
+    # Paths are cached without the host so that every hostname the site answers on shares one entry.
+    entries = cache.get('blog:sitemap')
+    if entries is not None:
+        return entries
+
     # List of static pages to include in the sitemap
     pages = [
         ('index', 0.9),  # Homepage, high priority
@@ -337,22 +880,7 @@ def sitemap():
         ('register', 0.3),
         ('reset_request', 0.2),
     ]
-    
-    # Generate dynamic URLs for blog posts
-    posts = Post.query.filter_by(is_published=True).order_by(Post.date_posted.desc()).all()
-    
-    xml_content = '<?xml version="1.0" encoding="UTF-8"?>\n'
-    xml_content += '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-
-    # Add static pages
-    for page, priority in pages:
-        xml_content += '  <url>\n'
-        xml_content += f'    <loc>{request.url_root.rstrip("/")}{url_for(page)}</loc>\n'
-        xml_content += f'    <lastmod>{datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")}</lastmod>\n' # Use current time or a specific update time
-        xml_content += f'    <priority>{priority}</priority>\n'
-        xml_content += '  </url>\n'
-
-    # Add dynamic pages for AI Tools (placeholders for now, will become actual routes later)
+    # Dynamic pages for AI Tools (placeholders for now, will become actual routes later)
     tool_pages = [
         'video_idea_generator_page',
         'seo_title_description_optimizer_page',
@@ -360,27 +888,21 @@ def sitemap():
         'youtube_subtitle_downloader_page',
         'youtube_thumbnail_downloader_page' # ADDED THIS LINE
     ]
-    for tool_page in tool_pages:
-        xml_content += '  <url>\n'
-        xml_content += f'    <loc>{request.url_root.rstrip("/")}{url_for(tool_page)}</loc>\n'
-        xml_content += f'    <lastmod>{datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")}</lastmod>\n'
-        xml_content += f'    <priority>0.7</priority>\n' # Medium priority for tools
-        xml_content += '  </url>\n'
-
+    lastmod = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ") # When this copy of the sitemap was built
 
-    # Add blog posts
-    for post in posts:
-        xml_content += '  <url>\n'
-        xml_content += f'    <loc>{request.url_root.rstrip("/")}{url_for("blog_post", slug=post.slug)}</loc>\n'
-        xml_content += f'    <lastmod>{post.date_posted.strftime("%Y-%m-%dT%H:%M:%SZ")}</lastmod>\n'
-        xml_content += '    <priority>0.8</priority>\n' # Blog posts are usually high priority
-        xml_content += '  </url>\n'
+    entries = [(url_for(page), lastmod, priority) for page, priority in pages]
+    entries += [(url_for(tool_page), lastmod, 0.7) for tool_page in tool_pages] # Medium priority for tools
 
-    xml_content += '</urlset>\n'
+    # Generate dynamic URLs for blog posts. Plain (slug, date_posted) rows fetched in batches never become
+    # ORM objects or enter the session, so only the finished entries are held in memory.
+    posts = (db.session.query(Post.slug, Post.date_posted)
+             .filter(Post.is_published.is_(True)).order_by(Post.date_posted.desc())
+             .yield_per(SITEMAP_BATCH_SIZE))
+    entries += [(url_for("blog_post", slug=slug), date_posted.strftime("%Y-%m-%dT%H:%M:%SZ"), 0.8) # Blog posts are usually high priority
+                for slug, date_posted in posts]
 
-    response = make_response(xml_content)
-    response.headers["Content-Type"] = "application/xml"
-    return response
+    cache.set('blog:sitemap', entries, timeout=BLOG_CACHE_TIMEOUT)
+    return entries
 
 @app.route('/robots.txt')
 def robots():
@@ -397,11 +919,10 @@ def robots():
     return response
 
 @app.route('/api/fetch_subtitles', methods=['POST'])
+@youtube_errors("fetching subtitle info")
 def fetch_subtitles():
     data = request.get_json(silent=True)
-    
-    print(f"Received data type: {type(data)}")
-    print(f"Received data: {data}")
+    app.logger.debug("fetch_subtitles payload type=%s value=%r", type(data).__name__, data)
 
     if not isinstance(data, dict):
         return jsonify({"success": False, "message": "Invalid request payload. Expected a JSON object."}), 400
@@ -410,46 +931,44 @@ def fetch_subtitles():
 
     if not video_id:
         return jsonify({"success": False, "message": "Video ID is required"}), 400
+    if not _is_valid_video_id(video_id):
+        return jsonify({"success": False, "message": "Invalid video ID"}), 400
 
-    global current_proxy_index
-    selected_proxy = None
-    if PROXIES_URLS_CLEANED:
-        selected_proxy = PROXIES_URLS_CLEANED[current_proxy_index % len(PROXIES_URLS_CLEANED)]
-        current_proxy_index += 1
-    
-    try:
-        if selected_proxy:
-            set_global_proxy_env(selected_proxy)
-        
-        transcript_list_obj = YouTubeTranscriptApi.list_transcripts(video_id)
-        transcript_list = list(transcript_list_obj)
-        
-        available_subtitles = []
-        for transcript in transcript_list:
-            available_subtitles.append({
-                "lang": transcript.language_code,
-                "name": transcript.language,
-                "is_auto_generated": transcript.is_generated,
-                "is_translatable": transcript.is_translatable
-            })
-        
-        return jsonify({"success": True, "subtitles": available_subtitles}), 200
-
-    except TranscriptsDisabled:
-        return jsonify({"success": False, "message": "Subtitles are disabled for this video."}), 404
-    except NoTranscriptFound:
-        return jsonify({"success": False, "message": "No subtitles found for this video (or they are not public/available)."}), 404
-    except requests.exceptions.RequestException as e:
-        print(f"Network or proxy error fetching subtitles: {e}")
-        return jsonify({"success": False, "message": "A network or proxy error occurred. Please try again or check proxy settings."}), 503
-    except Exception as e: # Corrected: 'a' changed to 'as e'
-        print(f"Error fetching subtitles: {e}")
-        return jsonify({"success": False, "message": "An unexpected error occurred while fetching subtitle info."}), 500
-    finally:
-        clear_global_proxy_env()
+    available_subtitles = _list_subtitles(video_id)
+    return jsonify({"success": True, "subtitles": available_subtitles}), 200
+
+
+@app.route('/api/fetch_subtitles_batch', methods=['POST'])
+def fetch_subtitles_batch():
+    """Lists subtitles for several videos at once, fetching them concurrently."""
+    data = request.get_json(silent=True)
+    video_ids = data.get('videoIds') if isinstance(data, dict) else None
+
+    if not isinstance(video_ids, list) or not video_ids:
+        return jsonify({"success": False, "message": "A non-empty 'videoIds' list is required"}), 400
+    if len(video_ids) > BATCH_MAX_VIDEOS:
+        return jsonify({"success": False, "message": f"At most {BATCH_MAX_VIDEOS} videos can be requested at once."}), 400
+
+    def fetch_one(video_id):
+        try:
+            return {"success": True, "subtitles": _list_subtitles(video_id)}
+        except Exception as e:
+            _, message = _youtube_error(e, "fetching subtitle info", video_id)
+            return {"success": False, "message": message}
+
+    # Entries are validated as sent, so non-strings (JSON numbers included) never reach YouTube; only
+    # valid IDs are deduplicated and looked up. Every entry starts out invalid to keep the request order,
+    # and the real lookups then replace theirs (also winning over a number that prints as the same ID).
+    unique_ids = list(dict.fromkeys(video_id for video_id in video_ids if _is_valid_video_id(video_id)))
+    results = {str(video_id): {"success": False, "message": "Invalid video ID"} for video_id in video_ids}
+    # The shared pool bounds how many YouTube requests are in flight at once, to avoid tripping bot detection.
+    results.update(zip(unique_ids, batch_executor.map(fetch_one, unique_ids)))
+
+    return jsonify({"success": True, "results": results}), 200
 
 
 @app.route('/api/download_subtitle', methods=['GET'])
+@youtube_errors("downloading the subtitle")
 def download_subtitle():
     video_id = request.args.get('videoId')
     lang = request.args.get('lang')
@@ -457,64 +976,105 @@ def download_subtitle():
 
     if not video_id or not lang:
         return jsonify({"success": False, "message": "Video ID and language are required"}), 400
-
-    global current_proxy_index
-    selected_proxy = None
-    if PROXIES_URLS_CLEANED:
-        selected_proxy = PROXIES_URLS_CLEANED[current_proxy_index % len(PROXIES_URLS_CLEANED)]
-        current_proxy_index += 1
-
-    try:
-        if selected_proxy:
-            set_global_proxy_env(selected_proxy)
-
-        transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=[lang])
-        
-        subtitle_content = ""
-
-        if file_format == 'txt':
-            for entry in transcript:
-                subtitle_content += f"{entry['text']}\n"
-            mimetype = "text/plain"
-            filename = f"{video_id}_{lang}.txt"
-        elif file_format == 'srt':
-            for i, entry in enumerate(transcript):
-                start_ms = int(entry['start'] * 1000)
-                end_ms = int((entry['start'] + entry['duration']) * 1000)
-
-                def format_timestamp(ms):
-                    hours = ms // 3_600_000
-                    ms %= 3_600_000
-                    minutes = ms // 60_000
-                    ms %= 60_000
-                    seconds = ms // 1_000
-                    milliseconds = ms % 1_000
-                    return f"{hours:02}:{minutes:02}:{seconds:02},{milliseconds:03}"
-
-                subtitle_content += f"{i + 1}\n"
-                subtitle_content += f"{format_timestamp(start_ms)} --> {format_timestamp(end_ms)}\n"
-                subtitle_content += f"{entry['text']}\n\n"
-            mimetype = "application/x-subrip"
-            filename = f"{video_id}_{lang}.srt"
-        else:
-            return jsonify({"success": False, "message": "Unsupported format. Only 'txt' and 'srt' are supported."}), 400
-
-        buffer = io.BytesIO(subtitle_content.encode('utf-8'))
-        
-        return send_file(buffer, mimetype=mimetype, as_attachment=True, download_name=filename)
-
-    except NoTranscriptFound:
-        return jsonify({"success": False, "message": "No subtitles found for this video (or they are not public/available)."}), 404
-    except TranscriptsDisabled:
-        return jsonify({"success": False, "message": "Subtitles are disabled for this video."}), 404
-    except requests.exceptions.RequestException as e:
-        print(f"Network or proxy error downloading subtitle: {e}")
-        return jsonify({"success": False, "message": "A network or proxy error occurred during download. Please try again or check proxy settings."}), 503
-    except Exception as e:
-        print(f"Error downloading subtitle: {e}")
-        return jsonify({"success": False, "message": "An unexpected error occurred while downloading the subtitle."}), 500
-    finally:
-        clear_global_proxy_env()
+    if not _is_valid_video_id(video_id):
+        return jsonify({"success": False, "message": "Invalid video ID"}), 400
+    if not _LANG_RE(lang):
+        return jsonify({"success": False, "message": "Invalid language code"}), 400
+
+    if file_format == 'txt':
+        mimetype = "text/plain"
+    elif file_format == 'srt':
+        mimetype = "application/x-subrip"
+    else:
+        return jsonify({"success": False, "message": "Unsupported format. Only 'txt' and 'srt' are supported."}), 400
+    headers = {
+        'Content-Disposition': f'attachment; filename="{video_id}_{lang}.{file_format}"',
+        # The same URL always yields the same file, so browsers and CDNs need not ask again for a day.
+        'Cache-Control': f'public, max-age={SUBTITLE_MAX_AGE}, immutable',
+    }
+
+    # The formatted file itself is cached, so repeat downloads skip both YouTube and the formatter.
+    body_key = _subtitle_file_key(video_id, lang, file_format)
+    body = cache.get(body_key)
+    if body is None:
+        transcript = _get_transcript(video_id, lang)
+
+        # Stream the file to the client while it is being formatted instead of buffering it first.
+        chunks = _iter_txt(transcript) if file_format == 'txt' else _iter_srt(transcript)
+        return Response(_stream_and_cache(chunks, body_key), mimetype=mimetype, headers=headers)
+
+    # Cached bytes go out as-is: no BytesIO wrapper or send_file range handling, and Content-Length is known.
+    return Response(body, mimetype=mimetype, headers=headers)
+
+@app.route('/api/download_subtitles_batch', methods=['POST'])
+def download_subtitles_batch():
+    """Downloads several subtitle files (any mix of videos and languages) as one ZIP, fetching them concurrently."""
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else None
+    file_format = data.get('format', 'srt') if isinstance(data, dict) else None
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "message": "A non-empty 'items' list is required"}), 400
+    if len(items) > BATCH_MAX_VIDEOS:
+        return jsonify({"success": False, "message": f"At most {BATCH_MAX_VIDEOS} subtitles can be requested at once."}), 400
+    if file_format not in ('txt', 'srt'):
+        return jsonify({"success": False, "message": "Unsupported format. Only 'txt' and 'srt' are supported."}), 400
+
+    pairs = []
+    for item in items:
+        video_id = item.get('videoId') if isinstance(item, dict) else None
+        lang = item.get('lang') if isinstance(item, dict) else None
+        if not _is_valid_video_id(video_id) or not isinstance(lang, str) or not _LANG_RE(lang):
+            return jsonify({"success": False, "message": "Every item needs a valid 'videoId' and 'lang'"}), 400
+        pairs.append((video_id, lang))
+    pairs = list(dict.fromkeys(pairs))
+
+    def fetch_one(pair):
+        video_id, lang = pair
+        try:
+            return _get_subtitle_file(video_id, lang, file_format), None
+        except Exception as e:
+            return None, _youtube_error(e, "downloading the subtitle", f"{video_id}/{lang}")
+
+    # Same shared pool as the listing batch, so the two endpoints together respect BATCH_CONCURRENCY.
+    results = list(batch_executor.map(fetch_one, pairs))
+    if all(body is None for body, _ in results):
+        status, message = results[0][1]
+        return jsonify({"success": False, "message": message}), status
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+        failures = []
+        for (video_id, lang), (body, error) in zip(pairs, results):
+            if body is None:
+                failures.append(f"{video_id}_{lang}: {error[1]}")
+            else:
+                zf.writestr(f"{video_id}_{lang}.{file_format}", body)
+        if failures:
+            zf.writestr("errors.txt", "\n".join(failures) + "\n")
+    archive.seek(0)
+    return send_file(archive, mimetype='application/zip', as_attachment=True, download_name='subtitles.zip')
+
+def _best_thumbnail_resolution(video_id, proxy_url):
+    """Returns the largest thumbnail size YouTube has for video_id, or None if it has none."""
+    session = make_session(proxy_url)
+
+    # img.youtube.com answers 404 for sizes a video doesn't have (the grey 120x90 placeholder is served as
+    # the 404 body), so the status alone tells real thumbnails apart and no Content-Length check is needed.
+    # Anything else (timeouts, dead proxies, 5xx) says nothing about the size and is raised for
+    # download_thumbnail to report like any other failed thumbnail request.
+    def available(resolution):
+        response = session.head(THUMBNAIL_URL.format(video_id=video_id, resolution=resolution),
+                                timeout=THUMBNAIL_TIMEOUT)
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+    # Every size is probed at once, so falling back costs one round trip rather than one per size.
+    # map() yields in THUMBNAIL_SIZES order, so the first hit is the largest available.
+    found = thumbnail_executor.map(available, THUMBNAIL_SIZES)
+    return next((resolution for resolution, ok in zip(THUMBNAIL_SIZES, found) if ok), None)
 
 @app.route('/api/download_thumbnail', methods=['GET'])
 def download_thumbnail():
@@ -523,62 +1083,64 @@ def download_thumbnail():
     
     if not video_id:
         return jsonify({"success": False, "message": "Video ID is required"}), 400
+    if not _is_valid_video_id(video_id):
+        return jsonify({"success": False, "message": "Invalid video ID"}), 400
+    if resolution != 'best' and resolution not in THUMBNAIL_RESOLUTIONS:
+        return jsonify({"success": False, "message": "Invalid resolution"}), 400
 
-    # Base URL for YouTube thumbnails.
-    # Common resolutions: 'maxresdefault', 'hqdefault', 'mqdefault', 'sddefault', 'default'
-    # 'maxresdefault' is generally 1280x720, 'hqdefault' is 480x360.
-    thumbnail_url = f"https://img.youtube.com/vi/{video_id}/{resolution}.jpg"
-
-    global current_proxy_index
-    selected_proxy = None
-    if PROXIES_URLS_CLEANED:
-        selected_proxy = PROXIES_URLS_CLEANED[current_proxy_index % len(PROXIES_URLS_CLEANED)]
-        current_proxy_index += 1
+    selected_proxy = pick_proxy()
 
     try:
-        proxies = {'http': selected_proxy, 'https': selected_proxy} if selected_proxy else None
-        
-        # Make a request to the thumbnail URL
-        response = requests.get(thumbnail_url, stream=True, proxies=proxies)
+        # 'best' picks the largest size this video actually has.
+        if resolution == 'best':
+            resolution = _best_thumbnail_resolution(video_id, selected_proxy)
+            if resolution is None:
+                return jsonify({"success": False, "message": "No thumbnail is available for this video."}), 404
+
+        # Base URL for YouTube thumbnails.
+        # Common resolutions: 'maxresdefault', 'hqdefault', 'mqdefault', 'sddefault', 'default'
+        # 'maxresdefault' is generally 1280x720, 'hqdefault' is 480x360.
+        thumbnail_url = THUMBNAIL_URL.format(video_id=video_id, resolution=resolution)
+        # Make a request to the thumbnail URL over the proxy's pooled keep-alive session.
+        # The timeout keeps a hung img.youtube.com from tying up this greenlet indefinitely.
+        response = make_session(selected_proxy).get(thumbnail_url, stream=True, timeout=THUMBNAIL_TIMEOUT)
         response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
 
-        # Check if the response content is likely a valid image (not a placeholder "no image" file)
-        # YouTube returns a 120x90 default.jpg if maxresdefault doesn't exist.
-        # We can check content length or response header for content-type.
-        if response.headers.get('Content-Type') != 'image/jpeg':
-            # This might indicate a placeholder image or an error from YouTube's side
-            # For simplicity, we'll proceed, but a more robust check could be added
-            # to differentiate between valid low-res and "not found" images.
-            pass
-
-        # Use BytesIO to keep the image in memory and send it as a file
-        image_buffer = io.BytesIO(response.content)
-        
         # Set filename for download
         filename = f"{video_id}_{resolution}_thumbnail.jpg"
+        headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+        # Without a Content-Encoding the upstream length is also the length of what we relay.
+        if 'Content-Length' in response.headers and 'Content-Encoding' not in response.headers:
+            headers['Content-Length'] = response.headers['Content-Length']
 
-        return send_file(image_buffer, mimetype='image/jpeg', as_attachment=True, download_name=filename)
+        # Relay the image as it arrives instead of holding the whole file in memory first.
+        streamed = Response(response.iter_content(THUMBNAIL_CHUNK_SIZE), mimetype='image/jpeg', headers=headers)
+        streamed.call_on_close(response.close)
+        return streamed
 
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 404:
             # This happens if a specific resolution (like maxresdefault) isn't available.
             # You might want to fall back to a lower resolution or return a specific message.
-            print(f"Thumbnail not found for resolution {resolution}: {e}")
+            app.logger.info("Thumbnail not found for resolution %s: %s", resolution, e)
             return jsonify({"success": False, "message": f"Thumbnail not found for the requested resolution '{resolution}'. Try 'hqdefault' or 'default'."}), 404
         else:
-            print(f"HTTP error downloading thumbnail: {e}")
+            app.logger.warning("HTTP error downloading thumbnail: %s", e)
             return jsonify({"success": False, "message": f"HTTP error occurred: {e.response.status_code}."}), 500
+    except requests.exceptions.ProxyError as e:
+        # The usual failure with a dead proxy; bench it like the subtitle endpoints do so the next pick skips it.
+        bench_proxy(selected_proxy)
+        app.logger.warning("Proxy error downloading thumbnail: %s", e)
+        return jsonify({"success": False, "message": "Failed to connect to YouTube's thumbnail service. Please check your network or proxy."}), 503
     except requests.exceptions.ConnectionError as e:
-        print(f"Connection error downloading thumbnail: {e}")
+        app.logger.warning("Connection error downloading thumbnail: %s", e)
         return jsonify({"success": False, "message": "Failed to connect to YouTube's thumbnail service. Please check your network or proxy."}), 503
     except requests.exceptions.Timeout as e:
-        print(f"Timeout error downloading thumbnail: {e}")
+        app.logger.warning("Timeout error downloading thumbnail: %s", e)
         return jsonify({"success": False, "message": "Request to YouTube's thumbnail service timed out."}), 504
     except Exception as e:
-        print(f"Error downloading thumbnail: {e}")
+        app.logger.exception("Error downloading thumbnail")
         return jsonify({"success": False, "message": "An unexpected error occurred while downloading the thumbnail."}), 500
-    finally:
-        clear_global_proxy_env()
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -590,9 +1152,15 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
+        if user is None:
+            try:
+                password_hasher.verify(_DUMMY_PASSWORD_HASH, form.password.data)
+            except VerificationError:
+                pass
         if user is None or not user.check_password(form.password.data):
             flash('Invalid username or password.', 'danger')
             return redirect(url_for('login'))
+        db.session.commit() # Persists the password hash if check_password upgraded it
         login_user(user)
         next_page = request.args.get('next')
         flash(f'Logged in as {user.username}.', 'success')
@@ -613,7 +1181,7 @@ def logout():
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     # Only allow registration if no users exist.
-    if User.query.count() > 0:
+    if users_exist():
         flash('Registration is currently closed.', 'danger')
         return redirect(url_for('login'))
 
@@ -641,7 +1209,15 @@ def send_reset_email(user):
 
 If you did not make this request then simply ignore this email and no changes will be made.
 '''
-    mail.send(msg)
+    mail_executor.submit(_send_email, msg)
+
+def _send_email(msg):
+    """Sends msg from a background thread, which needs its own app context for Flask-Mail."""
+    with app.app_context():
+        try:
+            mail.send(msg)
+        except Exception:
+            app.logger.exception("Failed to send email to %s", msg.recipients)
 
 @app.route("/reset_password", methods=['GET', 'POST'])
 def reset_request():
@@ -678,30 +1254,31 @@ def reset_token(token):
 
 
 # This ensures the Flask development server runs only when the script is executed directly.
+# --- CLI Commands ---
+@app.cli.command('init-db')
+def init_db():
+    """Creates any missing tables and a default admin user if there are no users yet. Run once per deploy."""
+    # IMPORTANT: db.create_all() creates tables, but migrations are preferred for changes.
+    # It's here for initial local setup convenience. For production, rely on 'flask db upgrade'.
+    db.create_all()
+
+    if not users_exist():
+        click.echo("No users found. Creating a default admin user.")
+        admin_username = os.getenv('ADMIN_DEFAULT_USERNAME', 'admin')
+        admin_email = os.getenv('ADMIN_DEFAULT_EMAIL', 'admin@example.com')
+        admin_password = os.getenv('ADMIN_DEFAULT_PASSWORD', 'password') # CHANGE THIS IN PRODUCTION!
+
+        new_admin = User(username=admin_username, email=admin_email)
+        new_admin.set_password(admin_password)
+        db.session.add(new_admin)
+        db.session.commit()
+        click.echo(f"Default admin user '{admin_username}' created. Password: '{admin_password}'")
+        click.echo("PLEASE LOG IN WITH THESE CREDENTIALS. AND CHANGE THIS PASSWORD IMMEDIATELY AFTER FIRST LOGIN!")
+
 if __name__ == '__main__':
     # Determine debug mode based on environment variable, default to False for production
     # Set FLASK_DEBUG=1 in your development environment to enable debug mode
     debug_mode = os.getenv('FLASK_DEBUG') == '1'
 
-    with app.app_context():
-        # IMPORTANT: db.create_all() creates tables, but migrations are preferred for changes.
-        # It's here for initial local setup convenience. For production, rely on 'flask db upgrade'.
-        db.create_all()
-
-        # Optional: Create an initial admin user if none exists
-        # This code will now ONLY create the user, it will NOT automatically log them in.
-        if User.query.count() == 0:
-            print("No users found. Creating a default admin user.")
-            admin_username = os.getenv('ADMIN_DEFAULT_USERNAME', 'admin')
-            admin_email = os.getenv('ADMIN_DEFAULT_EMAIL', 'admin@example.com')
-            admin_password = os.getenv('ADMIN_DEFAULT_PASSWORD', 'password') # CHANGE THIS IN PRODUCTION!
-
-            new_admin = User(username=admin_username, email=admin_email)
-            new_admin.set_password(admin_password)
-            db.session.add(new_admin)
-            db.session.commit()
-            print(f"Default admin user '{admin_username}' created. Password: '{admin_password}'")
-            print("PLEASE LOG IN WITH THESE CREDENTIALS. AND CHANGE THIS PASSWORD IMMEDIATELY AFTER FIRST LOGIN!")
-            
-    # Run the app. Debug mode is now conditional.
-    app.run(debug=debug_mode)
\ No newline at end of file
+    # Tables and the default admin user are set up separately: run 'flask --app app init-db' first.
+    app.run(debug=debug_mode)
@@ -0,0 +1,13 @@
+# Gunicorn settings, picked up automatically from the working directory (see Procfile).
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Cooperative workers: each one keeps many slow YouTube lookups in flight at once.
+# wsgi.py monkey-patches before the app is imported, so the shared requests sessions are non-blocking too.
+worker_class = 'gevent'
+worker_connections = 1000
+workers = int(os.getenv('WEB_CONCURRENCY', (os.cpu_count() or 1) * 2 + 1))
+
+keepalive = 75 # Seconds; longer than typical load-balancer idle timeouts so connections are reused
+timeout = 30
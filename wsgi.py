@@ -0,0 +1,7 @@
+# WSGI entry point for gunicorn's gevent workers.
+# Monkey-patching must happen before app.py is imported, so that every socket opened by
+# requests and youtube-transcript-api is cooperative.
+from gevent import monkey
+monkey.patch_all()
+
+from app import app